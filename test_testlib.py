@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+
+import contextlib
+import io
+import tempfile
+import unittest
+
+from pathlib import Path
+
+from testlib import SCRIPT_DIR, TestStatus, run_test
+
+# run_test never opens the ROM itself; the path just has to live under
+# the repo root so the progress print can relativize it.
+DUMMY_ROM = SCRIPT_DIR / 'dummy.gb'
+
+class RunTestTests(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+
+    def _run(self, script: str, timeout: int = 5):
+        binary = Path(self._tmp.name) / 'fake-emulator'
+        binary.write_text("#!/bin/sh\n" + script)
+        binary.chmod(0o755)
+        with contextlib.redirect_stdout(io.StringIO()):
+            return run_test(DUMMY_ROM, timeout=timeout, binary=binary)
+
+    def test_pass(self):
+        result = self._run('echo "some trace"\necho "Passed"\nsleep 30\n')
+        self.assertEqual(result.status, TestStatus.Pass)
+        self.assertIn("Passed", result.output)
+
+    def test_fail(self):
+        result = self._run('echo "Failed"\nsleep 30\n')
+        self.assertEqual(result.status, TestStatus.Fail)
+
+    def test_crash(self):
+        result = self._run('echo boom\nexit 1\n')
+        self.assertEqual(result.status, TestStatus.Crashed)
+        self.assertIn("boom", result.output)
+
+    def test_timeout_captures_output(self):
+        result = self._run('echo "still going"\nsleep 30\n', timeout=1)
+        self.assertEqual(result.status, TestStatus.Timeout)
+        self.assertIn("still going", result.output)
+
+if __name__ == '__main__':
+    unittest.main()
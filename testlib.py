@@ -0,0 +1,204 @@
+import subprocess
+import selectors
+import threading
+import time
+import fcntl
+import os
+
+from collections import deque
+from pathlib import Path
+from typing import IO, Deque, Optional
+from enum import Enum, auto
+from dataclasses import dataclass
+
+SCRIPT_DIR = Path(__file__).parent
+
+PRINT_LOCK = threading.Lock()
+
+def _binary_up_to_date(binary: Path) -> bool:
+    if not binary.exists():
+        return False
+    sources = [SCRIPT_DIR / 'Cargo.toml', *(SCRIPT_DIR / 'src').rglob('*.rs')]
+    newest_source = max((source.stat().st_mtime for source in sources), default=0.0)
+    return binary.stat().st_mtime > newest_source
+
+def build_emulator(release: bool) -> Path:
+    target = "release" if release else "debug"
+    binary = SCRIPT_DIR / 'target' / target / 'gameboy-rs'
+    if _binary_up_to_date(binary):
+        return binary
+
+    cmd = ['cargo', 'build']
+    if release:
+        cmd.append('--release')
+    ret = subprocess.run(
+        cmd,
+        capture_output=True,
+        cwd=SCRIPT_DIR,
+    )
+    if ret.returncode != 0:
+        print(ret.stderr)
+        print(ret.stdout)
+        ret.check_returncode()
+    return binary
+
+class TestStatus(Enum):
+    Pass = auto()
+    Fail = auto()
+    Timeout = auto()
+    Crashed = auto()
+
+@dataclass(slots=True)
+class TestResult:
+    rom: Path
+    status: TestStatus
+    output: str
+
+# Overlap kept between scans so a marker split across two reads is still found.
+SCAN_OVERLAP = len(b"Passed") - 1
+
+READ_CHUNK_SIZE = 1 << 16
+
+class StreamedOutput:
+    def __init__(self, stream: IO[bytes]):
+        self._fd = stream.fileno()
+        fl = fcntl.fcntl(self._fd, fcntl.F_GETFL)
+        fcntl.fcntl(self._fd, fcntl.F_SETFL, fl | os.O_NONBLOCK)
+        self._chunks: Deque[bytes] = deque()
+        self._tail = b""
+
+    def drain_all(self) -> str:
+        """Flush anything left in the pipe and return the full output."""
+        while self._poll_stream():
+            pass
+        return b"".join(self._chunks).decode("utf-8", errors="replace")
+
+    def read_new(self) -> bytes:
+        """Return content appended since the last call to read_new."""
+        new_chunks = []
+        while True:
+            chunk = self._poll_stream()
+            if not chunk:
+                break
+            new_chunks.append(chunk)
+        if not new_chunks:
+            return b""
+        window = self._tail + b"".join(new_chunks)
+        self._tail = window[-SCAN_OVERLAP:]
+        return window
+
+    def _poll_stream(self) -> Optional[bytes]:
+        try:
+            new_content = os.read(self._fd, READ_CHUNK_SIZE)
+        except BlockingIOError:
+            return None
+        if new_content:
+            self._chunks.append(new_content)
+        return new_content
+
+# (first byte, full marker, status): bytes.find on a single byte is a
+# memchr sweep in C, so the Python-level verify only runs on candidate hits.
+RESULT_MARKERS = (
+    (b"P", b"Passed", TestStatus.Pass),
+    (b"F", b"Failed", TestStatus.Fail),
+)
+
+def try_extract_result(output: StreamedOutput) -> Optional[TestStatus]:
+    chunk = output.read_new()
+    if not chunk:
+        return None
+
+    for first_byte, marker, status in RESULT_MARKERS:
+        idx = chunk.find(first_byte)
+        while idx >= 0:
+            if chunk[idx:idx + len(marker)] == marker:
+                return status
+            idx = chunk.find(first_byte, idx + 1)
+
+    return None
+
+def run_test(
+        rom: Path,
+        timeout: int,
+        binary: Path,
+) -> TestResult:
+    with PRINT_LOCK:
+        print(f"TEST: {rom.relative_to(SCRIPT_DIR)}")
+    deadline_ns = time.monotonic_ns() + timeout * 1_000_000_000
+
+    status = TestStatus.Timeout
+    output = ""
+
+    with subprocess.Popen(
+        [
+            binary,
+            '--rom', rom,
+            '--headless',
+            '--trace-mode', 'serial',
+        ],
+        cwd=SCRIPT_DIR,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+    ) as p:
+        streamed_output = None
+        try:
+            if p.stdout is None:
+                raise RuntimeError("stdout is None")
+            streamed_output = StreamedOutput(p.stdout)
+
+            with selectors.DefaultSelector() as sel:
+                sel.register(p.stdout, selectors.EVENT_READ)
+
+                while True:
+                    remaining_ns = deadline_ns - time.monotonic_ns()
+                    if remaining_ns <= 0:
+                        break
+                    sel.select(timeout=remaining_ns / 1e9)
+
+                    maybe_status = try_extract_result(streamed_output)
+                    if maybe_status is not None:
+                        status = maybe_status
+                        break
+
+                    if p.poll() is not None:
+                        status = TestStatus.Crashed
+                        break
+        finally:
+            p.terminate()
+            try:
+                p.wait(timeout=1.0)
+            except subprocess.TimeoutExpired:
+                p.kill()
+                p.wait()
+            # Materialize the output while the Popen context still holds
+            # the pipe open; after __exit__ the fd is closed.
+            if streamed_output is not None:
+                output = streamed_output.drain_all()
+
+    return TestResult(
+        rom=rom,
+        status=status,
+        output=output,
+    )
+
+def emit_result(result: TestResult) -> bool:
+    rom_name = result.rom.relative_to(SCRIPT_DIR)
+    with PRINT_LOCK:
+        if result.status == TestStatus.Pass:
+            print(f"OK: {rom_name}")
+            return True
+
+        if result.status == TestStatus.Fail:
+            print(f"Test failed: {rom_name}")
+        if result.status == TestStatus.Timeout:
+            print(f"Test timed out: {rom_name}")
+        if result.status == TestStatus.Crashed:
+            print(f"Test crashed: {rom_name}")
+
+        print("Test output: ")
+        print("==========================================")
+        print(result.output)
+        print("==========================================")
+        print()
+
+    return False